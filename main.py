@@ -1,19 +1,27 @@
 import os
 import smtplib
-import schedule
 import time
 import csv
-import base64
-import io
+import bisect
+import functools
+import queue
 import random
-from datetime import datetime, timedelta
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
+from email import policy
+from email.message import EmailMessage
+import orjson
 import requests
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
-import matplotlib
-matplotlib.use('Agg')  # Use non-interactive backend
-import matplotlib.pyplot as plt
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from markupsafe import Markup, escape
 import numpy as np
 
 # Load environment variables
@@ -30,13 +38,80 @@ EMAIL_ADDRESS = os.getenv('EMAIL_ADDRESS')
 EMAIL_PASSWORD = os.getenv('EMAIL_PASSWORD')  # App password for Gmail
 SMTP_SERVER = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
 SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
+SMTP_MAX_CONNECTIONS = max(1, int(os.getenv('SMTP_MAX_CONNECTIONS', '5')))  # Gmail allows 5 concurrent connections
+SMTP_SEND_DELAY = float(os.getenv('SMTP_SEND_DELAY', '0'))  # Optional pause (seconds) after each email per connection
 
 # CSV file path
 EMAIL_LIST_CSV = os.getenv('EMAIL_LIST_CSV', 'email-list.csv')
 
+# Maximum number of API requests in flight at once
+MAX_FETCH_WORKERS = 16
+
+# Largest API response body we are willing to download and parse
+MAX_RESPONSE_BYTES = 2_000_000
+
+
+def _announces_bounded_body(response):
+    """Whether a response may be cached - ones announcing an oversized body are never read into the cache"""
+    content_length = response.headers.get('Content-Length', '')
+    return not content_length.isdigit() or int(content_length) <= MAX_RESPONSE_BYTES
+
+
+# Shared HTTP session so every API call reuses pooled keep-alive connections
+# instead of paying a fresh TCP + TLS handshake per request. Responses are
+# cached on disk; URLs not listed below expire after 10 minutes (weather, stocks).
+# API key query parameters are stripped before anything is written to the cache
+HTTP_CACHE_FILE = 'http_cache'
+SESSION = requests_cache.CachedSession(
+    HTTP_CACHE_FILE,
+    backend='sqlite',
+    expire_after=600,
+    ignored_parameters=['appid', 'apiKey', 'api_key'],  # OpenWeatherMap, NewsAPI, TMDB
+    filter_fn=_announces_bounded_body,
+    urls_expire_after={
+        'xkcd.com/*/info.0.json': requests_cache.NEVER_EXPIRE,  # Published comics never change
+        'api.themoviedb.org/3/movie/top_rated': 86400,
+        'api.themoviedb.org/3/movie/': 604800,  # Movie details
+        'en.wikipedia.org/api/rest_v1/feed/onthisday': 86400,
+        'newsapi.org': 900,
+    },
+)
+SESSION.headers.update({'User-Agent': 'DailyBriefEmailApp/1.0 (Contact: scout3303@gmail.com)'})
+_http_adapter = HTTPAdapter(
+    pool_connections=8,
+    pool_maxsize=MAX_FETCH_WORKERS,
+    max_retries=Retry(total=2, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504), raise_on_status=False)
+)
+SESSION.mount('http://', _http_adapter)
+SESSION.mount('https://', _http_adapter)
+
 # XKCD state file to track last shown comic
 XKCD_STATE_FILE = 'last_xkcd_shown.txt'
 
+# Today's history/movie/XKCD picks are saved here so a same-day rerun sends the same content without refetching
+DAILY_CACHE_DIR = 'daily_cache'
+
+# Email HTML template, compiled once at import and rendered per recipient. The
+# template never changes while running, so skip reload checks, and keep the
+# compiled bytecode on disk so one-shot runs (RUN_ONCE / cron) skip recompiling it
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+TEMPLATE_ENV = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=True,
+    trim_blocks=True,
+    lstrip_blocks=True,
+    auto_reload=False,
+    bytecode_cache=FileSystemBytecodeCache()
+)
+EMAIL_TEMPLATE = TEMPLATE_ENV.get_template('email.html.j2')
+NEWS_TEMPLATE = TEMPLATE_ENV.get_template('sections/news.html.j2')
+HISTORY_TEMPLATE = TEMPLATE_ENV.get_template('sections/history.html.j2')
+MOVIE_TEMPLATE = TEMPLATE_ENV.get_template('sections/movie.html.j2')
+XKCD_TEMPLATE = TEMPLATE_ENV.get_template('sections/xkcd.html.j2')
+
+# Stand-in for the recipient's greeting, so everyone in one location can share a single rendered body
+GREETING_PLACEHOLDER = '%%GREETING%%'
+
 # State name to state code mapping
 STATE_MAPPING = {
     'Alabama': 'AL', 'Alaska': 'AK', 'Arizona': 'AZ', 'Arkansas': 'AR', 'California': 'CA',
@@ -53,15 +128,113 @@ STATE_MAPPING = {
 }
 
 
+@dataclass(frozen=True)
+class RunContext:
+    """Clock reading and date strings shared by everything in one newsletter run"""
+    now: datetime
+    today_date: date
+    yesterday_date: date
+    today_str: str  # 2024-01-31
+    month_str: str  # 01
+    day_str: str  # 31
+    long_date_str: str  # January 31, 2024
+    short_date_str: str  # 01/31/2024
+
+
+def create_run_context(now=None):
+    """Read the clock once and derive every date string the run needs"""
+    now = now or datetime.now()
+    return RunContext(
+        now=now,
+        today_date=now.date(),
+        yesterday_date=(now - timedelta(days=1)).date(),
+        today_str=now.strftime('%Y-%m-%d'),
+        month_str=f"{now.month:02d}",
+        day_str=f"{now.day:02d}",
+        long_date_str=now.strftime("%B %d, %Y"),
+        short_date_str=now.strftime('%m/%d/%Y')
+    )
+
+
+def daily_cache(fetch):
+    """Persist a fetcher's result for the rest of the run date in DAILY_CACHE_DIR"""
+    @functools.wraps(fetch)
+    def wrapper(run_context=None):
+        run_context = run_context or create_run_context()
+        prefix = f"{fetch.__name__}_"
+        filename = f"{prefix}{run_context.today_str}.json"
+        path = os.path.join(DAILY_CACHE_DIR, filename)
+        try:
+            with open(path, 'rb') as f:
+                return orjson.loads(f.read())
+        except (OSError, ValueError):
+            pass
+        
+        result = fetch(run_context)
+        
+        # Failed fetches return None - leave those uncached so the next run tries again
+        if result is not None:
+            try:
+                os.makedirs(DAILY_CACHE_DIR, exist_ok=True)
+                with open(path + '.tmp', 'wb') as f:
+                    f.write(orjson.dumps(result))
+                os.replace(path + '.tmp', path)
+                # Earlier days' picks are never read again
+                for name in os.listdir(DAILY_CACHE_DIR):
+                    if name.startswith(prefix) and name != filename:
+                        os.remove(os.path.join(DAILY_CACHE_DIR, name))
+            except OSError as e:
+                print(f"Warning: Could not save {fetch.__name__} cache: {e}")
+        return result
+    return wrapper
+
+
+# Case-insensitive view of STATE_MAPPING, plus the set of valid codes
+_STATE_MAPPING_LC = {name.lower(): code for name, code in STATE_MAPPING.items()}
+_VALID_STATE_CODES = set(STATE_MAPPING.values())
+
+
 def get_state_code(state_name):
-    """Convert state name to state code"""
-    if not state_name:
+    """Convert state name (any case) or code to state code"""
+    state = state_name.strip() if state_name else ''
+    if not state:
         return None
-    # Check if it's already a code (2 letters)
-    if len(state_name) == 2 and state_name.isupper():
-        return state_name
-    # Try to map state name to code
-    return STATE_MAPPING.get(state_name, state_name)
+    # Try to map state name to code, then accept codes in any case
+    code = _STATE_MAPPING_LC.get(state.lower())
+    if code:
+        return code
+    if state.upper() in _VALID_STATE_CODES:
+        return state.upper()
+    return state
+
+
+def get_json_bounded(url, headers=None, max_bytes=MAX_RESPONSE_BYTES, timeout=10):
+    """GET a JSON endpoint through the shared session, refusing bodies larger than max_bytes"""
+    endpoint = url.split('?')[0]  # Keep API keys out of error messages
+    with SESSION.get(url, headers=headers, timeout=timeout, stream=True) as response:
+        response.raise_for_status()
+        
+        # Reject oversized bodies up front when the server tells us the size. Over
+        # MAX_RESPONSE_BYTES the session skipped caching, so nothing has been read yet;
+        # smaller per-call limits may have cached the body, so evict it
+        content_length = response.headers.get('Content-Length')
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            SESSION.cache.delete(urls=[url])
+            raise requests.exceptions.RequestException(f"Response from {endpoint} is {content_length} bytes (limit {max_bytes})")
+        
+        body = bytearray()
+        for chunk in response.iter_content(chunk_size=65536):
+            body += chunk
+            if len(body) > max_bytes:
+                # Bodies without a Content-Length were read in full and cached - evict them so later runs refetch
+                SESSION.cache.delete(urls=[url])
+                raise requests.exceptions.RequestException(f"Response from {endpoint} exceeds {max_bytes} bytes")
+    
+    try:
+        return orjson.loads(body)
+    except ValueError as e:
+        SESSION.cache.delete(urls=[url])
+        raise requests.exceptions.InvalidJSONError(f"Invalid JSON from {endpoint}: {e}") from e
 
 
 def get_weather_data(city, state=None, zip_code=None):
@@ -77,10 +250,8 @@ def get_weather_data(city, state=None, zip_code=None):
             query = f"q={city},{COUNTRY_CODE}"
         
         # Get current weather
-        current_url = f"http://api.openweathermap.org/data/2.5/weather?{query}&appid={WEATHER_API_KEY}&units=imperial"
-        current_response = requests.get(current_url)
-        current_response.raise_for_status()
-        current_data = current_response.json()
+        current_url = f"https://api.openweathermap.org/data/2.5/weather?{query}&appid={WEATHER_API_KEY}&units=imperial"
+        current_data = get_json_bounded(current_url)
         
         # Get coordinates for forecast
         lat = current_data['coord']['lat']
@@ -90,19 +261,15 @@ def get_weather_data(city, state=None, zip_code=None):
         # Fall back to 5-day/3-hour forecast if One Call API is not available
         try:
             onecall_url = f"https://api.openweathermap.org/data/3.0/onecall?lat={lat}&lon={lon}&exclude=minutely,daily,alerts&appid={WEATHER_API_KEY}&units=imperial"
-            onecall_response = requests.get(onecall_url)
-            if onecall_response.status_code == 200:
-                onecall_data = onecall_response.json()
-                # Return current data with hourly forecast in compatible format
-                return current_data, {'list': onecall_data.get('hourly', [])}
+            onecall_data = get_json_bounded(onecall_url)
+            # Return current data with hourly forecast in compatible format
+            return current_data, {'list': onecall_data.get('hourly', [])}
         except:
             pass
         
         # Fallback: Use 5-day/3-hour forecast API
-        forecast_url = f"http://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={WEATHER_API_KEY}&units=imperial&cnt=40"
-        forecast_response = requests.get(forecast_url)
-        forecast_response.raise_for_status()
-        forecast_data = forecast_response.json()
+        forecast_url = f"https://api.openweathermap.org/data/2.5/forecast?lat={lat}&lon={lon}&appid={WEATHER_API_KEY}&units=imperial&cnt=40"
+        forecast_data = get_json_bounded(forecast_url)
         
         return current_data, forecast_data
     except requests.exceptions.RequestException as e:
@@ -110,7 +277,21 @@ def get_weather_data(city, state=None, zip_code=None):
         return None, None
 
 
-def get_moon_phase():
+# Upper bounds (days into the lunar cycle) of each moon phase but the last
+_MOON_PHASE_BOUNDS = (1.84566, 7.38264, 9.22831, 14.76529, 16.61096, 22.14794, 23.99361)
+_MOON_PHASES = (
+    ("New Moon", "🌑"),
+    ("Waxing Crescent", "🌒"),
+    ("First Quarter", "🌓"),
+    ("Waxing Gibbous", "🌔"),
+    ("Full Moon", "🌕"),
+    ("Waning Gibbous", "🌖"),
+    ("Last Quarter", "🌗"),
+    ("Waning Crescent", "🌘"),
+)
+
+
+def get_moon_phase(run_context=None):
     """Calculate current moon phase and return phase name and emoji"""
     # Known new moon date (Jan 11, 2024)
     known_new_moon = datetime(2024, 1, 11, 11, 57)
@@ -119,48 +300,29 @@ def get_moon_phase():
     lunar_cycle = 29.53058867
     
     # Calculate days since known new moon
-    now = datetime.now()
+    now = (run_context or create_run_context()).now
     days_since = (now - known_new_moon).total_seconds() / 86400
     
     # Calculate current position in lunar cycle (0-29.53)
     phase_position = days_since % lunar_cycle
     
     # Determine phase name and emoji
-    if phase_position < 1.84566:
-        return "New Moon", "🌑"
-    elif phase_position < 7.38264:
-        return "Waxing Crescent", "🌒"
-    elif phase_position < 9.22831:
-        return "First Quarter", "🌓"
-    elif phase_position < 14.76529:
-        return "Waxing Gibbous", "🌔"
-    elif phase_position < 16.61096:
-        return "Full Moon", "🌕"
-    elif phase_position < 22.14794:
-        return "Waning Gibbous", "🌖"
-    elif phase_position < 23.99361:
-        return "Last Quarter", "🌗"
-    else:
-        return "Waning Crescent", "🌘"
+    return _MOON_PHASES[bisect.bisect_right(_MOON_PHASE_BOUNDS, phase_position)]
 
 
-def get_historical_fact():
+@daily_cache
+def get_historical_fact(run_context=None):
     """Fetch historical event that happened on this day using Wikipedia's On This Day API"""
     try:
-        now = datetime.now()
-        month = str(now.month).zfill(2)  # Pad with zero
-        day = str(now.day).zfill(2)  # Pad with zero
+        run_context = run_context or create_run_context()
+        month = run_context.month_str
+        day = run_context.day_str
         
         # Wikipedia REST API endpoint (different format)
         url = f'https://en.wikipedia.org/api/rest_v1/feed/onthisday/events/{month}/{day}'
         
-        headers = {
-            'User-Agent': 'DailyBriefEmailApp/1.0 (Contact: scout3303@gmail.com)'
-        }
-        
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        data = response.json()
+        # The session's default User-Agent satisfies Wikipedia's API policy
+        data = get_json_bounded(url)
         
         # Get events from history
         events = data.get('events', [])
@@ -209,9 +371,7 @@ def get_stock_market_data():
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
         }
         
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = get_json_bounded(url, headers=headers)
         
         # Get the latest price and previous close
         result = data.get('chart', {}).get('result', [{}])[0]
@@ -240,7 +400,17 @@ def get_stock_market_data():
         return None
 
 
-def get_movie_recommendation():
+# Star rating for each whole point on TMDB's 10-point scale: one star per 2 points, a half star for an odd point
+_STAR_RATINGS = tuple('⭐' * (points // 2) + '✨' * (points % 2) + '☆' * (5 - points // 2 - points % 2) for points in range(11))
+
+
+def get_star_rating(rating):
+    """Turn a 0-10 rating into a five-star visualization"""
+    return _STAR_RATINGS[min(max(int(rating), 0), 10)]
+
+
+@daily_cache
+def get_movie_recommendation(run_context=None):
     """Fetch a movie recommendation from The Movie Database (TMDB) API"""
     if not TMDB_API_KEY:
         print("Warning: TMDB_API_KEY not set. Skipping movie recommendation.")
@@ -252,9 +422,7 @@ def get_movie_recommendation():
         random_page = random.randint(1, 10)
         url = f'https://api.themoviedb.org/3/movie/top_rated?api_key={TMDB_API_KEY}&page={random_page}'
         
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = get_json_bounded(url)
         
         movies = data.get('results', [])
         
@@ -265,9 +433,7 @@ def get_movie_recommendation():
             # Get movie details for more information
             movie_id = movie.get('id')
             details_url = f'https://api.themoviedb.org/3/movie/{movie_id}?api_key={TMDB_API_KEY}'
-            details_response = requests.get(details_url, timeout=10)
-            details_response.raise_for_status()
-            details = details_response.json()
+            details = get_json_bounded(details_url)
             
             # Build poster URL
             poster_path = movie.get('poster_path', '')
@@ -282,14 +448,15 @@ def get_movie_recommendation():
             runtime_str = f"{runtime} min" if runtime else 'N/A'
             
             # Get rating
-            rating = movie.get('vote_average', 0)
+            rating = round(movie.get('vote_average', 0), 1)
             
             return {
                 'title': movie.get('title', 'Unknown'),
                 'overview': movie.get('overview', 'No overview available.'),
                 'poster_url': poster_url,
                 'release_date': movie.get('release_date', 'N/A'),
-                'rating': round(rating, 1),
+                'rating': rating,
+                'stars': get_star_rating(rating),
                 'genres': genre_str,
                 'runtime': runtime_str,
                 'tmdb_url': f"https://www.themoviedb.org/movie/{movie_id}"
@@ -301,15 +468,14 @@ def get_movie_recommendation():
         return None
 
 
-def get_xkcd_comic():
+@daily_cache
+def get_xkcd_comic(run_context=None):
     """Fetch XKCD comic - latest if published today/yesterday and not yet shown, otherwise random"""
     try:
         # First, fetch the latest comic to check if it's new
         latest_url = 'https://xkcd.com/info.0.json'
         
-        response = requests.get(latest_url, timeout=10)
-        response.raise_for_status()
-        latest_data = response.json()
+        latest_data = get_json_bounded(latest_url)
         
         # Check if the latest comic was published today or yesterday
         # This catches comics published either:
@@ -322,8 +488,9 @@ def get_xkcd_comic():
         
         # Create date object for the comic's publication date
         comic_date = datetime(int(comic_year), int(comic_month), int(comic_day)).date()
-        today = datetime.now().date()
-        yesterday = (datetime.now() - timedelta(days=1)).date()
+        run_context = run_context or create_run_context()
+        today = run_context.today_date
+        yesterday = run_context.yesterday_date
         
         # Check if comic is from today or yesterday
         is_recent = (comic_date == today) or (comic_date == yesterday)
@@ -363,9 +530,7 @@ def get_xkcd_comic():
             
             # Fetch the random comic
             random_url = f'https://xkcd.com/{random_num}/info.0.json'
-            random_response = requests.get(random_url, timeout=10)
-            random_response.raise_for_status()
-            random_data = random_response.json()
+            random_data = get_json_bounded(random_url)
             
             return {
                 'title': random_data.get('title', ''),
@@ -382,7 +547,11 @@ def get_xkcd_comic():
         return None
 
 
-def get_top_news_stories(num_stories=8):
+# Titles of articles NewsAPI has pulled ("[Removed]") and horoscopes
+_NEWS_SKIP_TITLE_RE = re.compile(r'^\[removed\]$|horoscope', re.IGNORECASE)
+
+
+def get_top_news_stories(num_stories=8, run_context=None):
     """Fetch top news stories and big USA headlines using NewsAPI"""
     if not NEWS_API_KEY:
         print("Warning: NEWS_API_KEY not set. Skipping news section.")
@@ -391,11 +560,11 @@ def get_top_news_stories(num_stories=8):
     try:
         # Use top-headlines endpoint without 'from' parameter to get the biggest current headlines
         # Request more articles than needed so we can filter and prioritize
-        url = f'https://newsapi.org/v2/top-headlines?country=us&pageSize={num_stories * 2}&apiKey={NEWS_API_KEY}'
+        # NewsAPI caps pageSize at 100
+        page_size = min(max(num_stories, 1) * 2, 100)
+        url = f'https://newsapi.org/v2/top-headlines?country=us&pageSize={page_size}&apiKey={NEWS_API_KEY}'
         
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+        data = get_json_bounded(url)
         
         articles = data.get('articles', [])
         
@@ -403,42 +572,38 @@ def get_top_news_stories(num_stories=8):
         # Also filter out removed articles and those without meaningful content
         filtered_articles = []
         for article in articles:
-            title = article.get('title', '')
-            url = article.get('url', '')
-            description = article.get('description', '')
-            
-            # Skip if missing key information or marked as removed
-            if not title or not url or title == '[Removed]':
-                continue
+            title = article.get('title')
+            description = article.get('description')
             
-            # Skip horoscope articles
-            if 'horoscope' in title.lower():
+            # Skip if missing key information, marked as removed, a horoscope,
+            # or the description is too short (likely not a major story)
+            if not title or not article.get('url') or _NEWS_SKIP_TITLE_RE.search(title) or (description and len(description) < 30):
                 continue
             
-            # Skip if description is too short (likely not a major story)
-            if description and len(description) < 30:
-                continue
-                
             filtered_articles.append(article)
         
         # Also fetch "everything" endpoint for breaking news to supplement
         # This helps catch major stories that might not be in top-headlines yet
-        try:
-            today = datetime.now().strftime('%Y-%m-%d')
-            everything_url = f'https://newsapi.org/v2/everything?q=USA OR "United States" OR breaking&language=en&sortBy=popularity&from={today}&pageSize=10&apiKey={NEWS_API_KEY}'
-            
-            everything_response = requests.get(everything_url, timeout=10)
-            if everything_response.status_code == 200:
-                everything_data = everything_response.json()
+        # (only needed if filtering left us short, since extras are appended last)
+        if len(filtered_articles) < num_stories:
+            try:
+                today = (run_context or create_run_context()).today_str
+                everything_url = f'https://newsapi.org/v2/everything?q=USA OR "United States" OR breaking&language=en&sortBy=popularity&from={today}&pageSize=10&apiKey={NEWS_API_KEY}'
+                
+                # Only 10 supplementary articles are requested, so anything past 200 KB is an upstream problem
+                everything_data = get_json_bounded(everything_url, max_bytes=200_000)
                 everything_articles = everything_data.get('articles', [])
                 
                 # Add articles from everything endpoint that aren't already included
                 existing_urls = {a.get('url') for a in filtered_articles}
                 for article in everything_articles:
-                    if article.get('url') not in existing_urls and article.get('title') and article.get('title') != '[Removed]':
+                    url = article.get('url')
+                    title = article.get('title')
+                    if url not in existing_urls and title and not _NEWS_SKIP_TITLE_RE.search(title):
+                        existing_urls.add(url)
                         filtered_articles.append(article)
-        except Exception as e:
-            print(f"Note: Could not fetch supplementary news: {e}")
+            except Exception as e:
+                print(f"Note: Could not fetch supplementary news: {e}")
         
         # Return top stories up to the requested number
         return filtered_articles[:num_stories]
@@ -453,108 +618,84 @@ def get_top_news_stories(num_stories=8):
 
 def interpolate_to_hourly(forecasts, start_time, end_time):
     """Interpolate 3-hourly forecasts to create 2-hourly entries"""
-    hourly_forecasts = []
+    if not forecasts:
+        return []
     
     # Create a list of 2-hour intervals from start to end
+    target_timestamps = []
     current_hour = start_time.replace(minute=0, second=0, microsecond=0)
-    
     while current_hour <= end_time:
-        current_timestamp = current_hour.timestamp()
-        
-        # Find the closest forecast points for interpolation
-        before_forecast = None
-        after_forecast = None
-        
-        for i, forecast in enumerate(forecasts):
-            if forecast['dt'] <= current_timestamp:
-                before_forecast = forecast
-                if i + 1 < len(forecasts):
-                    after_forecast = forecasts[i + 1]
-            elif forecast['dt'] > current_timestamp:
-                if before_forecast is None:
-                    before_forecast = forecast
-                after_forecast = forecast
-                break
-        
-        # If we have both before and after, interpolate
-        if before_forecast and after_forecast:
-            # Calculate interpolation factor (0 to 1)
-            time_diff = after_forecast['dt'] - before_forecast['dt']
-            if time_diff > 0:
-                factor = (current_timestamp - before_forecast['dt']) / time_diff
-                
-                # Interpolate temperature
-                temp_before = before_forecast['main']['temp']
-                temp_after = after_forecast['main']['temp']
-                interpolated_temp = temp_before + (temp_after - temp_before) * factor
-                
-                # Interpolate feels like
-                feels_before = before_forecast['main']['feels_like']
-                feels_after = after_forecast['main']['feels_like']
-                interpolated_feels = feels_before + (feels_after - feels_before) * factor
-                
-                # Use the closer forecast's weather condition
-                if factor < 0.5:
-                    weather_info = before_forecast['weather'][0]
-                else:
-                    weather_info = after_forecast['weather'][0]
-                
-                # Interpolate pop (precipitation probability)
-                pop_before = before_forecast.get('pop', 0)
-                pop_after = after_forecast.get('pop', 0)
-                interpolated_pop = pop_before + (pop_after - pop_before) * factor
-                
-                # Create interpolated forecast entry
-                interpolated_forecast = {
-                    'dt': current_timestamp,
-                    'main': {
-                        'temp': interpolated_temp,
-                        'feels_like': interpolated_feels
-                    },
-                    'weather': [weather_info],
-                    'pop': interpolated_pop
-                }
-                hourly_forecasts.append(interpolated_forecast)
-            else:
-                # Use the forecast as-is
-                hourly_forecasts.append(before_forecast.copy())
-                hourly_forecasts[-1]['dt'] = current_timestamp
-        elif before_forecast:
-            # Only have before forecast, use it
-            hourly_forecasts.append(before_forecast.copy())
-            hourly_forecasts[-1]['dt'] = current_timestamp
-        elif after_forecast:
-            # Only have after forecast, use it
-            hourly_forecasts.append(after_forecast.copy())
-            hourly_forecasts[-1]['dt'] = current_timestamp
-        
-        # Move to next 2-hour interval
+        target_timestamps.append(current_hour.timestamp())
         current_hour += timedelta(hours=2)
     
+    if not target_timestamps:
+        return []
+    
+    # Pull the forecast series into arrays once so every interval is interpolated in a single pass
+    targets = np.array(target_timestamps)
+    dts = np.array([f['dt'] for f in forecasts], dtype=float)
+    temps = np.interp(targets, dts, [f['main']['temp'] for f in forecasts]).tolist()
+    feels = np.interp(targets, dts, [f['main']['feels_like'] for f in forecasts]).tolist()
+    pops = np.interp(targets, dts, [f.get('pop', 0) for f in forecasts]).tolist()
+    
+    # Index of the last forecast at or before each target, and the one after it
+    before_idx = np.clip(np.searchsorted(dts, targets, side='right') - 1, 0, len(dts) - 1)
+    after_idx = np.minimum(before_idx + 1, len(dts) - 1)
+    
+    # Use the closer forecast's weather condition
+    use_after = (targets - dts[before_idx]) >= (dts[after_idx] - targets)
+    nearest_idx = np.where(use_after, after_idx, before_idx).tolist()
+    
+    # Targets outside the forecast range just reuse the nearest end forecast as-is
+    in_range = ((targets >= dts[0]) & (targets < dts[-1])).tolist()
+    
+    hourly_forecasts = []
+    for i, current_timestamp in enumerate(target_timestamps):
+        if in_range[i]:
+            hourly_forecasts.append({
+                'dt': current_timestamp,
+                'main': {
+                    'temp': temps[i],
+                    'feels_like': feels[i]
+                },
+                'weather': [forecasts[nearest_idx[i]]['weather'][0]],
+                'pop': pops[i]
+            })
+        else:
+            edge_forecast = forecasts[0] if current_timestamp < dts[0] else forecasts[-1]
+            hourly_forecasts.append(edge_forecast.copy())
+            hourly_forecasts[-1]['dt'] = current_timestamp
+    
     return hourly_forecasts
 
 
+# OpenWeatherMap condition-code ranges as sorted boundaries for bisect; the emoji at
+# index i covers codes from _WEATHER_ID_BOUNDS[i-1] up to (not including) _WEATHER_ID_BOUNDS[i]
+_WEATHER_ID_BOUNDS = (200, 233, 300, 322, 500, 505, 520, 532, 600, 623, 701, 782, 800, 801, 802, 803, 805)
+_WEATHER_ID_EMOJIS = (
+    None,
+    '⛈️', None,  # 200-232 Thunderstorm
+    '🌦️', None,  # 300-321 Drizzle
+    '🌧️', None,  # 500-504 Rain
+    '🌧️', None,  # 520-531 Rain
+    '❄️', None,  # 600-622 Snow
+    '🌫️', None,  # 701-781 Atmosphere (fog, mist, etc.)
+    '☀️',  # 800 Clear
+    '🌤️',  # 801 Few clouds
+    '⛅',  # 802 Scattered clouds
+    '☁️',  # 803-804 Broken/Overcast clouds
+    None,
+)
+
+
+# Only a few hundred (id, description) pairs exist, and every hourly row looks one up
+@functools.lru_cache(maxsize=512)
 def get_weather_emoji(weather_id, description):
     """Get emoji based on weather condition"""
-    # Check weather ID ranges and specific codes
-    if 200 <= weather_id < 233:  # Thunderstorm
-        return '⛈️'
-    elif 300 <= weather_id < 322:  # Drizzle
-        return '🌦️'
-    elif 500 <= weather_id < 505 or 520 <= weather_id < 532:  # Rain
-        return '🌧️'
-    elif 600 <= weather_id < 623:  # Snow
-        return '❄️'
-    elif 701 <= weather_id < 782:  # Atmosphere (fog, mist, etc.)
-        return '🌫️'
-    elif weather_id == 800:  # Clear
-        return '☀️'
-    elif weather_id == 801:  # Few clouds
-        return '🌤️'
-    elif weather_id == 802:  # Scattered clouds
-        return '⛅'
-    elif weather_id == 803 or weather_id == 804:  # Broken/Overcast clouds
-        return '☁️'
+    # Look up the weather ID range
+    emoji = _WEATHER_ID_EMOJIS[bisect.bisect_right(_WEATHER_ID_BOUNDS, weather_id)]
+    if emoji:
+        return emoji
     
     # Fallback based on description
     desc_lower = description.lower()
@@ -578,50 +719,124 @@ def get_weather_emoji(weather_id, description):
         return '🌤️'
 
 
-def generate_temperature_chart(forecast_list):
-    """Generate a compact temperature chart as base64 encoded image"""
-    try:
-        # Filter to next 24 hours
-        now = datetime.now().timestamp()
-        next_24h = [f for f in forecast_list if f['dt'] <= now + 86400][:8]  # Up to 8 forecasts (24 hours)
-        
-        if not next_24h:
-            return None
-        
-        times = [datetime.fromtimestamp(f['dt']).strftime("%I%p").lstrip('0') for f in next_24h]
-        temps = [f['main']['temp'] for f in next_24h]
-        feels_like = [f['main']['feels_like'] for f in next_24h]
-        
-        # Create compact figure
-        fig, ax = plt.subplots(figsize=(8, 3.5))
-        ax.plot(times, temps, 'o-', linewidth=2, markersize=6, color='#e74c3c', label='Temp')
-        ax.plot(times, feels_like, 's--', linewidth=1.5, markersize=4, color='#3498db', alpha=0.6, label='Feels')
-        ax.fill_between(times, temps, alpha=0.2, color='#e74c3c')
-        ax.set_ylabel('°F', fontsize=10, fontweight='bold')
-        ax.set_xlabel('Time', fontsize=10)
-        ax.grid(True, alpha=0.2, linestyle='-', linewidth=0.5)
-        ax.legend(loc='upper right', framealpha=0.9, fontsize=9)
-        ax.set_facecolor('#fafafa')
-        fig.patch.set_facecolor('white')
-        plt.tight_layout(pad=1.0)
+def render_news_html(news_articles, stock_data=None):
+    """Render the news section (with the S&P 500 indicator) as HTML, or '' without articles"""
+    if not news_articles:
+        return Markup('')
+    
+    articles = []
+    for article in news_articles:
+        # NewsAPI sends null for missing descriptions
+        article_description = article.get('description') or ''
         
-        # Convert to base64
-        buf = io.BytesIO()
-        plt.savefig(buf, format='png', dpi=80, bbox_inches='tight', facecolor='white', edgecolor='none')
-        buf.seek(0)
-        img_base64 = base64.b64encode(buf.read()).decode('utf-8')
-        buf.close()
-        plt.close(fig)
+        # Truncate description if too long (a 201st character means it's over the limit)
+        if article_description[200:201]:
+            article_description = article_description[:200] + '...'
         
-        return img_base64
-    except Exception as e:
-        print(f"Error generating temperature chart: {e}")
-        return None
+        articles.append({
+            'title': article.get('title', 'No title'),
+            'description': article_description,
+            'url': article.get('url', '#'),
+            'source': article.get('source', {}).get('name', 'Unknown')
+        })
+    
+    stock = None
+    if stock_data:
+        is_positive = stock_data['is_positive']
+        stock = {
+            'percent_change': stock_data['percent_change'],
+            'arrow': "▲" if is_positive else "▼",
+            'color': "#27ae60" if is_positive else "#e74c3c",
+            'sign': "+" if is_positive else ""
+        }
+    
+    return Markup(NEWS_TEMPLATE.render(news_articles=articles, stock=stock))
 
 
+def render_history_html(historical_fact):
+    """Render the on-this-day section as HTML, or '' without a fact"""
+    if not historical_fact:
+        return Markup('')
+    return Markup(HISTORY_TEMPLATE.render(historical_fact=historical_fact))
 
 
-def format_weather_email(current_data, forecast_data, recipient_name=None, news_articles=None, historical_fact=None, stock_data=None, movie_recommendation=None, xkcd_comic=None):
+def render_movie_html(movie_recommendation):
+    """Render the movie recommendation section as HTML, or '' without a movie"""
+    if not movie_recommendation:
+        return Markup('')
+    
+    release_date = movie_recommendation.get('release_date', 'N/A')
+    rating = movie_recommendation.get('rating', 0)
+    overview = movie_recommendation.get('overview', '')
+    
+    # Truncate overview if too long (a 301st character means it's over the limit)
+    if overview[300:301]:
+        overview = overview[:297] + '...'
+    
+    movie = {
+        'title': movie_recommendation.get('title', ''),
+        'overview': overview,
+        'poster_url': movie_recommendation.get('poster_url', ''),
+        'release_year': release_date.split('-')[0] if release_date and release_date != 'N/A' else 'N/A',
+        'rating': rating,
+        'stars': movie_recommendation['stars'],
+        'genres': movie_recommendation.get('genres', 'N/A'),
+        'runtime': movie_recommendation.get('runtime', 'N/A'),
+        'tmdb_url': movie_recommendation.get('tmdb_url', '')
+    }
+    return Markup(MOVIE_TEMPLATE.render(movie=movie))
+
+
+def render_xkcd_html(xkcd_comic):
+    """Render the XKCD comic section as HTML, or '' without a comic"""
+    if not xkcd_comic:
+        return Markup('')
+    return Markup(XKCD_TEMPLATE.render(xkcd_comic=xkcd_comic))
+
+
+def render_shared_sections(news_articles=None, historical_fact=None, stock_data=None, movie_recommendation=None, xkcd_comic=None):
+    """Render the sections that are identical for every recipient, keyed by template variable"""
+    return {
+        'news_html': render_news_html(news_articles, stock_data),
+        'history_html': render_history_html(historical_fact),
+        'movie_html': render_movie_html(movie_recommendation),
+        'xkcd_html': render_xkcd_html(xkcd_comic)
+    }
+
+
+def get_greeting(recipient_name):
+    """Greeting line shown in the email footer"""
+    return f"Hi {recipient_name}," if recipient_name else "Hi,"
+
+
+def personalize_email(body, recipient_name):
+    """Fill a shared email body's greeting placeholder in for one recipient"""
+    return body.replace(GREETING_PLACEHOLDER, str(escape(get_greeting(recipient_name))))
+
+
+def build_hourly_rows(forecasts):
+    """Turn hourly forecast entries into display-ready table rows"""
+    hourly_rows = []
+    for i, forecast in enumerate(forecasts):
+        forecast_time = datetime.fromtimestamp(forecast['dt'])
+        forecast_desc = forecast['weather'][0]['description'].title()
+        
+        # Get precipitation probability (pop) - OpenWeatherMap provides this as a decimal (0-1)
+        pop = forecast.get('pop', 0) * 100  # Convert to percentage
+        
+        hourly_rows.append({
+            'time_str': forecast_time.strftime("%I %p").lstrip('0'),  # Show only hour, no minutes
+            'temp': round(forecast['main']['temp']),
+            'desc': forecast_desc,
+            'emoji': get_weather_emoji(forecast['weather'][0]['id'], forecast_desc),
+            'pop_display': f"{int(pop)}%" if pop > 0 else "—",
+            'pop_color': "#3498db" if pop > 50 else "#7f8c8d" if pop > 0 else "#999",
+            'row_bg': "#fafafa" if i % 2 == 0 else "#ffffff"  # Alternate row background for readability
+        })
+    return hourly_rows
+
+
+def format_weather_email(current_data, forecast_data, recipient_name=None, news_articles=None, historical_fact=None, stock_data=None, movie_recommendation=None, xkcd_comic=None, moon_phase=None, run_context=None, greeting=None, sections=None):
     """Format weather data and news into a compact, focused email"""
     if not current_data or not forecast_data:
         return "Error: Could not fetch weather data."
@@ -633,7 +848,8 @@ def format_weather_email(current_data, forecast_data, recipient_name=None, news_
     city_name = current_data['name']
     weather_id = current_data['weather'][0]['id']
     weather_emoji = get_weather_emoji(weather_id, description)
-    current_date = datetime.now().strftime("%B %d, %Y")
+    run_context = run_context or create_run_context()
+    current_date = run_context.long_date_str
     
     # Get sunrise/sunset times
     sunrise_timestamp = current_data['sys']['sunrise']
@@ -642,7 +858,7 @@ def format_weather_email(current_data, forecast_data, recipient_name=None, news_
     sunset_time = datetime.fromtimestamp(sunset_timestamp).strftime("%I:%M %p").lstrip('0')
     
     # Get forecast from 8am to 10pm (every 2 hours)
-    now = datetime.now()
+    now = run_context.now
     
     # If before 8am, show today's forecast
     # If 8am or later, show tomorrow's forecast (since script sends at 8am for the day ahead)
@@ -681,14 +897,17 @@ def format_weather_email(current_data, forecast_data, recipient_name=None, news_
     else:
         next_24h_forecasts = []
     
-    # Get moon phase
-    moon_phase_name, moon_phase_emoji = get_moon_phase()
+    # Get moon phase (the same for every recipient, so callers usually pass it in)
+    moon_phase_name, moon_phase_emoji = moon_phase or get_moon_phase(run_context)
+    
+    # Hourly forecast rows with rain probability
+    hourly_rows = build_hourly_rows(next_24h_forecasts)
     
     # Calculate high/low from forecast
-    if next_24h_forecasts:
-        temps = [round(f['main']['temp']) for f in next_24h_forecasts]
-        high_temp = max(temps) if temps else current_temp
-        low_temp = min(temps) if temps else current_temp
+    if hourly_rows:
+        temps = [row['temp'] for row in hourly_rows]
+        high_temp = max(temps)
+        low_temp = min(temps)
     else:
         high_temp = current_temp
         low_temp = current_temp
@@ -696,372 +915,168 @@ def format_weather_email(current_data, forecast_data, recipient_name=None, news_
     # Create preview text for email inbox
     preview_text = f"In {city_name}, the high is {high_temp}° and the low is {low_temp}°. You can expect {description.lower()} today. Open up to see some of the top news stories of the day."
     
-    # Personalize greeting
-    greeting = f"Hi {recipient_name}," if recipient_name else "Hi,"
-    
-    # Build compact, focused email
-    email_body = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-    </head>
-    <body style="margin: 0; padding: 0; font-family: Arial, sans-serif; background-color: #f5f5f5;">
-        <!-- Preview Text (hidden in email, shows in inbox preview) -->
-        <div style="display: none; max-height: 0; overflow: hidden; mso-hide: all;">{preview_text}</div>
-        <div style="max-width: 500px; margin: 0 auto; background-color: #ffffff; padding: 20px;">
-            <!-- Current Weather - Three Column Layout -->
-            <div style="padding: 15px 0; border-bottom: 2px solid #e0e0e0;">
-                <table style="width: 100%; border-collapse: collapse;">
-                    <tr>
-                        <!-- Column 1: Location & Date -->
-                        <td style="width: 33%; vertical-align: top;">
-                            <div style="font-size: 14px; font-weight: 500; color: #333; line-height: 1.4;">{city_name}</div>
-                            <div style="font-size: 12px; color: #999; margin-top: 2px;">{current_date}</div>
-                        </td>
-                        
-                        <!-- Column 2: Current Weather -->
-                        <td style="width: 34%; vertical-align: top;">
-                            <table style="width: 100%; border-collapse: collapse;">
-                                <tr>
-                                    <td style="vertical-align: middle; text-align: right; padding-right: 8px; width: 50%;">
-                                        <div style="font-size: 14px; font-weight: 500; color: #333; line-height: 1.4;">{current_temp}°F</div>
-                                        <div style="font-size: 12px; color: #666; margin-top: 2px;">{description}</div>
-                                    </td>
-                                    <td style="font-size: 32px; vertical-align: middle; text-align: left; padding-left: 8px; width: 50%;">{weather_emoji}</td>
-                                </tr>
-                            </table>
-                        </td>
-                        
-                        <!-- Column 3: Moon Phase -->
-                        <td style="width: 33%; text-align: right; vertical-align: top;">
-                            <table style="margin-left: auto; border-collapse: collapse;">
-                                <tr>
-                                    <td style="vertical-align: middle; text-align: right; padding-right: 12px;">
-                                        <div style="font-size: 14px; font-weight: 500; color: #333; line-height: 1.4;">{moon_phase_name}</div>
-                                        <div style="font-size: 12px; color: #666; margin-top: 2px;">Moon Phase</div>
-                                    </td>
-                                    <td style="font-size: 32px; vertical-align: middle;">{moon_phase_emoji}</td>
-                                </tr>
-                            </table>
-                        </td>
-                    </tr>
-                </table>
-                <!-- Sunrise/Sunset -->
-                <div style="margin-top: 12px; padding-top: 12px; border-top: 1px solid #f0f0f0;">
-                    <table style="width: 100%; border-collapse: collapse;">
-                        <tr>
-                            <td style="text-align: left; font-size: 14px; color: #666;">🌅 {sunrise_time}</td>
-                            <td style="text-align: right; font-size: 14px; color: #666;">🌇 {sunset_time}</td>
-                        </tr>
-                    </table>
-                </div>
-            </div>
-            
-            <!-- Hourly Forecast -->
-            <div style="padding-top: 15px;">
-                <h3 style="margin: 0 0 12px 0; font-size: 16px; color: #333; font-weight: bold;">Today's Forecast</h3>
-                <table style="width: 100%; border-collapse: collapse;">
-                    <thead>
-                        <tr style="border-bottom: 2px solid #e0e0e0;">
-                            <th style="padding: 8px 5px; text-align: left; font-size: 12px; color: #666; font-weight: 600;">Time</th>
-                            <th style="padding: 8px 5px; text-align: center; font-size: 12px; color: #666; font-weight: 600;">Condition</th>
-                            <th style="padding: 8px 5px; text-align: right; font-size: 12px; color: #666; font-weight: 600;">Temp</th>
-                            <th style="padding: 8px 5px; text-align: left; font-size: 12px; color: #666; font-weight: 600;">Description</th>
-                            <th style="padding: 8px 5px; text-align: center; font-size: 12px; color: #666; font-weight: 600;">Rain</th>
-                        </tr>
-                    </thead>
-                    <tbody>
-    """
-    
-    # Add hourly forecast entries with rain probability
-    for i, forecast in enumerate(next_24h_forecasts):
-        forecast_time = datetime.fromtimestamp(forecast['dt'])
-        time_str = forecast_time.strftime("%I %p").lstrip('0')  # Show only hour, no minutes
-        forecast_temp = round(forecast['main']['temp'])
-        forecast_desc = forecast['weather'][0]['description'].title()
-        forecast_weather_id = forecast['weather'][0]['id']
-        forecast_emoji = get_weather_emoji(forecast_weather_id, forecast_desc)
-        
-        # Get precipitation probability (pop) - OpenWeatherMap provides this as a decimal (0-1)
-        pop = forecast.get('pop', 0) * 100  # Convert to percentage
-        pop_display = f"{int(pop)}%" if pop > 0 else "—"
-        pop_color = "#3498db" if pop > 50 else "#7f8c8d" if pop > 0 else "#999"
-        
-        # Alternate row background for readability
-        row_bg = "#fafafa" if i % 2 == 0 else "#ffffff"
-        
-        email_body += f"""
-                        <tr style="background-color: {row_bg}; border-bottom: 1px solid #f0f0f0;">
-                            <td style="padding: 10px 5px; font-size: 13px; color: #333; font-weight: 500;">{time_str}</td>
-                            <td style="padding: 10px 5px; text-align: center; font-size: 24px;">{forecast_emoji}</td>
-                            <td style="padding: 10px 5px; text-align: right; font-size: 15px; font-weight: bold; color: #333;">{forecast_temp}°F</td>
-                            <td style="padding: 10px 5px; font-size: 12px; color: #666;">{forecast_desc}</td>
-                            <td style="padding: 10px 5px; text-align: center; font-size: 12px; font-weight: 500; color: {pop_color};">{pop_display}</td>
-                        </tr>
-        """
-    
-    email_body += f"""
-                    </tbody>
-                </table>
-            </div>
-    """
-    
-    # Add News Section if articles are available
-    if news_articles and len(news_articles) > 0:
-        email_body += """
-            <!-- News Section -->
-            <div style="padding-top: 20px; border-top: 2px solid #e0e0e0; margin-top: 20px;">
-                <h3 style="margin: 0 0 10px 0; font-size: 16px; color: #333; font-weight: bold;">📰 Top News</h3>
-        """
-        
-        # Add S&P 500 data if available
-        if stock_data:
-            change = stock_data['change']
-            percent_change = stock_data['percent_change']
-            is_positive = stock_data['is_positive']
-            arrow = "▲" if is_positive else "▼"
-            color = "#27ae60" if is_positive else "#e74c3c"
-            sign = "+" if is_positive else ""
-            
-            email_body += f"""
-                <div style="background-color: #f8f9fa; padding: 10px 15px; border-radius: 6px; margin-bottom: 15px; border-left: 3px solid {color};">
-                    <table style="width: 100%; border-collapse: collapse;">
-                        <tr>
-                            <td style="font-size: 13px; color: #666; font-weight: 500;">S&P 500</td>
-                            <td style="text-align: right; font-size: 15px; font-weight: 600; color: {color};">{arrow} {sign}{percent_change}%</td>
-                        </tr>
-                    </table>
-                </div>
-            """
-        
-        for i, article in enumerate(news_articles):
-            title = article.get('title', 'No title')
-            description = article.get('description', '')
-            url = article.get('url', '#')
-            source = article.get('source', {}).get('name', 'Unknown')
-            
-            # Truncate description if too long
-            if description and len(description) > 200:
-                description = description[:200] + '...'
-            
-            # Only show description if available
-            desc_html = f'<div style="font-size: 12px; color: #666; line-height: 1.5; margin-top: 5px;">{description}</div>' if description else ''
-            
-            email_body += f"""
-                <div style="padding: 12px 0; border-bottom: 1px solid #f0f0f0;">
-                    <div style="font-size: 14px; font-weight: 600; color: #333; line-height: 1.4; margin-bottom: 5px;">
-                        <a href="{url}" style="color: #2c3e50; text-decoration: none;">{title}</a>
-                    </div>
-                    {desc_html}
-                    <div style="margin-top: 6px;">
-                        <a href="{url}" style="font-size: 11px; color: #3498db; text-decoration: none; font-weight: 500;">Read more →</a>
-                        <span style="font-size: 11px; color: #999; margin-left: 8px;">• {source}</span>
-                    </div>
-                </div>
-            """
-        
-        email_body += """
-            </div>
-        """
-    
-    # Add Historical Fact Section if available
-    if historical_fact:
-        year = historical_fact.get('year', '')
-        text = historical_fact.get('text', '')
-        url = historical_fact.get('url', '')
-        
-        email_body += f"""
-            <!-- Historical Fact Section -->
-            <div style="padding: 20px 0; border-top: 2px solid #e0e0e0; margin-top: 20px;">
-                <h3 style="margin: 0 0 12px 0; font-size: 16px; color: #333; font-weight: bold;">📜 On This Day in History</h3>
-                <div style="background-color: #f8f9fa; padding: 15px; border-radius: 8px; border-left: 4px solid #9b59b6;">
-                    <div style="font-size: 18px; font-weight: 600; color: #8e44ad; margin-bottom: 8px;">{year}</div>
-                    <div style="font-size: 13px; color: #555; line-height: 1.6;">{text}</div>
-                    {f'<div style="margin-top: 10px;"><a href="{url}" style="font-size: 11px; color: #3498db; text-decoration: none; font-weight: 500;">Learn more →</a></div>' if url else ''}
-                </div>
-            </div>
-        """
-    
-    # Add Movie Recommendation Section if available
-    if movie_recommendation:
-        title = movie_recommendation.get('title', '')
-        overview = movie_recommendation.get('overview', '')
-        poster_url = movie_recommendation.get('poster_url', '')
-        release_date = movie_recommendation.get('release_date', 'N/A')
-        rating = movie_recommendation.get('rating', 0)
-        genres = movie_recommendation.get('genres', 'N/A')
-        runtime = movie_recommendation.get('runtime', 'N/A')
-        tmdb_url = movie_recommendation.get('tmdb_url', '')
-        
-        # Format release year
-        release_year = release_date.split('-')[0] if release_date and release_date != 'N/A' else 'N/A'
-        
-        # Create star rating visualization
-        full_stars = int(rating / 2)  # Convert 10-point scale to 5-star
-        half_star = 1 if (rating / 2) - full_stars >= 0.5 else 0
-        empty_stars = 5 - full_stars - half_star
-        stars = '⭐' * full_stars + ('✨' if half_star else '') + '☆' * empty_stars
-        
-        # Truncate overview if too long
-        if len(overview) > 300:
-            overview = overview[:297] + '...'
-        
-        email_body += f"""
-            <!-- Movie Recommendation Section -->
-            <div style="padding: 20px 0; border-top: 2px solid #e0e0e0; margin-top: 20px;">
-                <h3 style="margin: 0 0 12px 0; font-size: 16px; color: #333; font-weight: bold;">🎬 Movie Recommendation of the Day</h3>
-                <div style="background-color: #f8f9fa; padding: 15px; border-radius: 8px; border-left: 4px solid #e74c3c;">
-                    <table style="width: 100%; border-collapse: collapse;">
-                        <tr>
-                            {'<td style="width: 100px; vertical-align: top; padding-right: 15px;"><a href="' + tmdb_url + '"><img src="' + poster_url + '" alt="' + title + ' poster" style="width: 100px; border-radius: 4px; box-shadow: 0 2px 4px rgba(0,0,0,0.2);" /></a></td>' if poster_url else ''}
-                            <td style="vertical-align: top;">
-                                <div style="font-size: 16px; font-weight: 600; color: #c0392b; margin-bottom: 6px;">
-                                    <a href="{tmdb_url}" style="color: #c0392b; text-decoration: none;">{title}</a>
-                                    <span style="font-size: 13px; color: #999; font-weight: normal;"> ({release_year})</span>
-                                </div>
-                                <div style="font-size: 12px; color: #666; margin-bottom: 8px;">
-                                    <span style="margin-right: 10px;">{stars} {rating}/10</span>
-                                    <span style="margin-right: 10px;">• {genres}</span>
-                                    <span>• {runtime}</span>
-                                </div>
-                                <div style="font-size: 13px; color: #555; line-height: 1.5; margin-bottom: 10px;">{overview}</div>
-                                <div>
-                                    <a href="{tmdb_url}" style="font-size: 11px; color: #3498db; text-decoration: none; font-weight: 500;">View on TMDB →</a>
-                                </div>
-                            </td>
-                        </tr>
-                    </table>
-                </div>
-            </div>
-        """
-    
-    # Add XKCD Comic if available
-    if xkcd_comic:
-        title = xkcd_comic.get('title', '')
-        img_url = xkcd_comic.get('img', '')
-        alt_text = xkcd_comic.get('alt', '')
-        link = xkcd_comic.get('link', '')
-        label = xkcd_comic.get('label', 'Comic of the Day')
-        is_new = xkcd_comic.get('is_new', False)
-        
-        email_body += f"""
-            <!-- XKCD Comic -->
-            <div style="padding-top: 20px; border-top: 2px solid #e0e0e0; margin-top: 20px;">
-                <h3 style="margin: 0 0 8px 0; font-size: 16px; color: #333; font-weight: bold;">💥 XKCD Comic</h3>
-                <div style="margin: 0 0 12px 0; font-size: 13px; color: #666;">{label}</div>
-                <div style="text-align: center; background-color: #f8f9fa; padding: 15px; border-radius: 8px;">
-                    <a href="{link}" style="text-decoration: none;">
-                        <img src="{img_url}" alt="{alt_text}" style="max-width: 100%; height: auto; border-radius: 4px;" />
-                    </a>
-                    <div style="margin-top: 12px; font-size: 14px; font-weight: 600; color: #333;">{title}</div>
-                    <div style="margin-top: 6px; font-size: 11px; color: #666; font-style: italic; line-height: 1.4;">"{alt_text}"</div>
-                    <div style="margin-top: 8px;">
-                        <a href="{link}" style="font-size: 11px; color: #3498db; text-decoration: none; font-weight: 500;">View on xkcd.com →</a>
-                    </div>
-                </div>
-            </div>
-        """
+    # Personalize greeting (callers sharing one body across recipients pass GREETING_PLACEHOLDER)
+    if greeting is None:
+        greeting = get_greeting(recipient_name)
     
-    email_body += f"""
-            <!-- Footer -->
-            <div style="margin-top: 20px; padding-top: 15px; border-top: 1px solid #e0e0e0; text-align: center; font-size: 11px; color: #999;">
-                {greeting} Weather from OpenWeatherMap{', News from NewsAPI' if news_articles else ''}{', History from Wikipedia' if historical_fact else ''}{', Movies from TMDB' if movie_recommendation else ''}{', Comic from XKCD' if xkcd_comic else ''}
-            </div>
-        </div>
-    </body>
-    </html>
-    """
+    # Sections shared by every recipient are normally rendered once per run by the caller
+    if sections is None:
+        sections = render_shared_sections(news_articles, historical_fact, stock_data, movie_recommendation, xkcd_comic)
     
-    return email_body
+    # Build compact, focused email
+    return EMAIL_TEMPLATE.render(
+        preview_text=preview_text,
+        greeting=greeting,
+        city_name=city_name,
+        current_date=current_date,
+        current_temp=current_temp,
+        description=description,
+        weather_emoji=weather_emoji,
+        moon_phase_name=moon_phase_name,
+        moon_phase_emoji=moon_phase_emoji,
+        sunrise_time=sunrise_time,
+        sunset_time=sunset_time,
+        hourly_rows=hourly_rows,
+        **sections
+    )
+
+
+# Parallel send workers log through log_line() so their lines never run together
+_LOG_LOCK = threading.Lock()
 
 
-def send_email(body, recipient_email, recipient_name=None):
-    """Send email with weather information"""
+def log_line(message):
+    """Print one complete log line, safe to call from several threads at once"""
+    with _LOG_LOCK:
+        print(message, flush=True)
+
+
+def start_smtp_session(server):
+    """Upgrade a freshly connected SMTP server to TLS and log in"""
+    server.ehlo()
+    server.starttls()
+    server.ehlo()
+    server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
+
+
+def open_smtp_connection():
+    """Open one authenticated SMTP connection to reuse for every recipient"""
+    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=30)
     try:
-        # Create message
-        msg = MIMEMultipart('alternative')
-        msg['Subject'] = f"🛸 Daily Brief - {datetime.now().strftime('%m/%d/%Y')}"
+        start_smtp_session(server)
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+def send_email(body, recipient_email, recipient_name=None, server=None, run_context=None):
+    """Send email with weather information over an open SMTP connection (or a one-off one)"""
+    try:
+        # Single-part HTML message, serialized once with CRLF line endings ready for the wire
+        msg = EmailMessage(policy=policy.SMTP)
+        msg['Subject'] = f"🛸 Daily Brief - {(run_context or create_run_context()).short_date_str}"
         msg['From'] = f"Scout <{EMAIL_ADDRESS}>"
         msg['To'] = recipient_email
-        
-        # Create HTML part
-        html_part = MIMEText(body, 'html')
-        msg.attach(html_part)
+        msg.set_content(body, subtype='html', cte='quoted-printable')
+        raw_message = msg.as_bytes()
         
         # Send email
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(EMAIL_ADDRESS, EMAIL_PASSWORD)
-            server.send_message(msg)
+        if server is None:
+            with open_smtp_connection() as one_off_server:
+                one_off_server.sendmail(EMAIL_ADDRESS, [recipient_email], raw_message)
+        else:
+            try:
+                server.sendmail(EMAIL_ADDRESS, [recipient_email], raw_message)
+            except smtplib.SMTPServerDisconnected:
+                # Server dropped the idle connection - reconnect once and retry
+                log_line(f"SMTP connection lost, reconnecting to {SMTP_SERVER}...")
+                server.connect(SMTP_SERVER, SMTP_PORT)
+                start_smtp_session(server)
+                server.sendmail(EMAIL_ADDRESS, [recipient_email], raw_message)
         
         name_str = f" to {recipient_name}" if recipient_name else ""
-        print(f"Email sent successfully{name_str} ({recipient_email}) at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        log_line(f"Email sent successfully{name_str} ({recipient_email}) at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         return True
     except Exception as e:
-        print(f"Error sending email to {recipient_email}: {e}")
+        log_line(f"Error sending email to {recipient_email}: {e}")
         return False
 
 
-def load_user_list():
-    """Load user list from CSV file"""
-    users = []
+class Recipient(NamedTuple):
+    """One row of the recipient CSV"""
+    name: str
+    email: str
+    city: str
+    state: str
+    zip: str
+
+
+# CSV header for each Recipient field, in field order
+RECIPIENT_CSV_COLUMNS = ('Name', 'Email', 'City', 'State', 'Zip')
+
+
+def load_user_list(path=None):
+    """Load user list from CSV file as Recipient rows"""
+    path = path or EMAIL_LIST_CSV
     try:
-        with open(EMAIL_LIST_CSV, 'r', encoding='utf-8') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                users.append({
-                    'name': row.get('Name', '').strip(),
-                    'email': row.get('Email', '').strip(),
-                    'city': row.get('City', '').strip(),
-                    'state': row.get('State', '').strip(),
-                    'zip': row.get('Zip', '').strip()
-                })
-        print(f"Loaded {len(users)} user(s) from {EMAIL_LIST_CSV}")
+        with open(path, 'r', encoding='utf-8', newline='') as csvfile:
+            reader = csv.reader(csvfile)
+            
+            # Position of each Recipient field's column; a missing column reads as empty
+            header_index = {column.strip(): i for i, column in enumerate(next(reader, []))}
+            positions = [header_index.get(column) for column in RECIPIENT_CSV_COLUMNS]
+            
+            users = [
+                Recipient._make(
+                    row[i].strip() if i is not None and i < len(row) else ''
+                    for i in positions
+                )
+                for row in reader
+                if row  # Blank lines
+            ]
+        print(f"Loaded {len(users)} user(s) from {path}")
         return users
     except FileNotFoundError:
-        print(f"Error: {EMAIL_LIST_CSV} not found.")
+        print(f"Error: {path} not found.")
         return []
     except Exception as e:
-        print(f"Error reading {EMAIL_LIST_CSV}: {e}")
+        print(f"Error reading {path}: {e}")
         return []
 
 
-def send_weather_email_to_user(user, news_articles=None, historical_fact=None, stock_data=None, movie_recommendation=None, xkcd_comic=None):
-    """Fetch weather and send email to a single user"""
-    name = user['name']
-    email = user['email']
-    city = user['city']
-    state = user['state']
-    zip_code = user['zip']
+def get_location_key(user):
+    """Key identifying which weather lookup a user needs, so recipients in one place share it"""
+    return (user.city.lower(), user.state.lower(), user.zip)
+
+
+def send_weather_email_to_user(user, location_body, server=None, run_context=None):
+    """Personalize the user's location email body and send it"""
+    name, email, city, state, zip_code = user
     
     if not email:
-        print(f"Skipping user {name}: No email address")
+        log_line(f"Skipping user {name}: No email address")
         return False
     
     if not city:
-        print(f"Skipping user {name}: No city specified")
+        log_line(f"Skipping user {name}: No city specified")
         return False
     
-    print(f"Processing weather for {name} ({email}) in {city}, {state if state else 'N/A'}")
+    log_line(f"Processing weather for {name} ({email}) in {city}, {state if state else 'N/A'}")
     
-    # Get weather data
-    current_data, forecast_data = get_weather_data(city, state, zip_code)
-    
-    if current_data and forecast_data:
-        # Format email with all content
-        email_body = format_weather_email(current_data, forecast_data, name, news_articles, historical_fact, stock_data, movie_recommendation, xkcd_comic)
-        
+    if location_body:
         # Send email
-        return send_email(email_body, email, name)
+        return send_email(personalize_email(location_body, name), email, name, server, run_context)
     else:
-        print(f"Failed to fetch weather data for {city}. Email not sent to {email}.")
+        log_line(f"Failed to fetch weather data for {city}. Email not sent to {email}.")
         return False
 
 
 def send_daily_weather_email():
     """Main function to fetch weather and send emails to all users"""
-    print(f"Running scheduled task at {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+    # Read the clock once so every section agrees on "today", even across midnight
+    run_context = create_run_context()
+    print(f"Running scheduled task at {run_context.now.strftime('%Y-%m-%d %H:%M:%S')}")
     
     # Load user list
     users = load_user_list()
@@ -1070,54 +1085,115 @@ def send_daily_weather_email():
         print("No users found. Email not sent.")
         return
     
-    # Fetch news once for all users (to save API calls)
-    print("Fetching top news stories...")
-    news_articles = get_top_news_stories(num_stories=8)
+    # Fire all API requests at once - the shared sections and each location's
+    # weather are independent, so total wait is the slowest call, not the sum
+    print("Fetching news, historical fact, stock market data, movie recommendation, XKCD comic and weather...")
+    with ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS) as executor:
+        news_future = executor.submit(get_top_news_stories, num_stories=8, run_context=run_context)
+        historical_future = executor.submit(get_historical_fact, run_context)
+        stock_future = executor.submit(get_stock_market_data)
+        movie_future = executor.submit(get_movie_recommendation, run_context)
+        xkcd_future = executor.submit(get_xkcd_comic, run_context)
+        
+        # Recipients in the same place share one weather lookup
+        weather_futures = {}
+        for user in users:
+            location = get_location_key(user)
+            if user.email and user.city and location not in weather_futures:
+                weather_futures[location] = executor.submit(get_weather_data, user.city, user.state, user.zip)
+        
+        news_articles = news_future.result()
+        historical_fact = historical_future.result()
+        stock_data = stock_future.result()
+        movie_recommendation = movie_future.result()
+        xkcd_comic = xkcd_future.result()
+        weather_by_location = {location: future.result() for location, future in weather_futures.items()}
+    
     if news_articles:
         print(f"Found {len(news_articles)} news articles")
     else:
         print("No news articles found or NewsAPI key not configured")
     
-    # Fetch historical fact once for all users
-    print("Fetching historical fact...")
-    historical_fact = get_historical_fact()
     if historical_fact:
         print(f"Found historical fact from {historical_fact.get('year')}")
     else:
         print("No historical fact found")
     
-    # Fetch stock market data
-    print("Fetching stock market data...")
-    stock_data = get_stock_market_data()
     if stock_data:
         print(f"S&P 500: {stock_data['change']:+.2f} ({stock_data['percent_change']:+.2f}%)")
     else:
         print("No stock market data found")
     
-    # Fetch movie recommendation
-    print("Fetching movie recommendation...")
-    movie_recommendation = get_movie_recommendation()
     if movie_recommendation:
         print(f"Movie recommendation: {movie_recommendation.get('title')} ({movie_recommendation.get('rating')}/10)")
     else:
         print("No movie recommendation found")
     
-    # Fetch XKCD comic
-    print("Fetching XKCD comic...")
-    xkcd_comic = get_xkcd_comic()
     if xkcd_comic:
         status = "NEW" if xkcd_comic.get('is_new') else "RANDOM"
         print(f"Found XKCD ({status}) #{xkcd_comic.get('num')}: {xkcd_comic.get('title')}")
     else:
         print("No XKCD comic found")
     
-    # Send email to each user
-    success_count = 0
-    for user in users:
-        if send_weather_email_to_user(user, news_articles, historical_fact, stock_data, movie_recommendation, xkcd_comic):
-            success_count += 1
-        # Small delay between emails to avoid rate limiting
-        time.sleep(1)
+    # Moon phase doesn't depend on location either
+    moon_phase = get_moon_phase(run_context)
+    
+    # The news/history/movie/comic sections are the same for everyone, so render them once
+    sections = render_shared_sections(news_articles, historical_fact, stock_data, movie_recommendation, xkcd_comic)
+    
+    # Render each location's email once; recipients there only differ by greeting
+    body_by_location = {}
+    for location, (current_data, forecast_data) in weather_by_location.items():
+        if current_data and forecast_data:
+            body_by_location[location] = format_weather_email(current_data, forecast_data, moon_phase=moon_phase, run_context=run_context, greeting=GREETING_PLACEHOLDER, sections=sections)
+    
+    # Connect and log in once up front so bad credentials fail fast
+    try:
+        first_server = open_smtp_connection()
+    except Exception as e:
+        print(f"Error connecting to SMTP server {SMTP_SERVER}: {e}")
+        return
+    
+    # Idle logged-in connections. Each worker borrows one per email and only opens
+    # another when none are free, so at most SMTP_MAX_CONNECTIONS are ever open
+    smtp_pool = queue.SimpleQueue()
+    smtp_pool.put(first_server)
+    open_servers = [first_server]
+    
+    def send_to_user(user):
+        # Users without an address or city are only logged and skipped - don't tie up a connection
+        if not user.email or not user.city:
+            return send_weather_email_to_user(user, None)
+        
+        try:
+            server = smtp_pool.get_nowait()
+        except queue.Empty:
+            try:
+                server = open_smtp_connection()
+            except Exception as e:
+                log_line(f"Error connecting to SMTP server {SMTP_SERVER}: {e}")
+                return False
+            open_servers.append(server)
+        
+        try:
+            sent = send_weather_email_to_user(user, body_by_location.get(get_location_key(user)), server, run_context)
+            # Optional pacing for providers that throttle bursts on one connection
+            if sent and SMTP_SEND_DELAY > 0:
+                time.sleep(SMTP_SEND_DELAY)
+            return sent
+        finally:
+            smtp_pool.put(server)
+    
+    # Send emails in parallel - SMTP is network-bound, so threads overlap the waiting
+    sendable_count = sum(1 for user in users if user.email and user.city)
+    with ThreadPoolExecutor(max_workers=max(1, min(SMTP_MAX_CONNECTIONS, sendable_count))) as executor:
+        success_count = sum(executor.map(send_to_user, users))
+    
+    for server in open_servers:
+        try:
+            server.quit()
+        except Exception:
+            pass
     
     print(f"Completed: {success_count}/{len(users)} emails sent successfully.")
 
@@ -1141,17 +1217,21 @@ def main():
         print("Running in single-execution mode...")
         send_daily_weather_email()
     else:
-        # Schedule the email to be sent every day at 8:00 AM
-        schedule.every().day.at("08:00").do(send_daily_weather_email)
-        
         print("Weather email scheduler started. Emails will be sent daily at 8:00 AM.")
         print(f"Current time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         print("Press Ctrl+C to stop.")
         
-        # Run scheduler
         while True:
-            schedule.run_pending()
-            time.sleep(60)  # Check every minute
+            now = datetime.now()
+            next_run = now.replace(hour=8, minute=0, second=0, microsecond=0)
+            if next_run <= now:
+                next_run += timedelta(days=1)
+            
+            # Sleep in steps of at most 5 minutes, re-reading the clock each time. One long
+            # sleep would run late across DST changes or while the machine is suspended
+            while (remaining := (next_run - datetime.now()).total_seconds()) > 0:
+                time.sleep(min(remaining, 300))
+            send_daily_weather_email()
 
 
 if __name__ == "__main__":